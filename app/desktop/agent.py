@@ -1,10 +1,11 @@
 """MyCastle Desktop Agent - MQTT-connected system automation agent."""
 
 import asyncio
+import itertools
 import json
 import logging
 import signal
-import sys
+import threading
 import time
 import uuid
 
@@ -13,6 +14,17 @@ import paho.mqtt.client as mqtt
 import config
 import operations
 
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+    _loads = json.loads
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
@@ -20,6 +32,9 @@ logging.basicConfig(
 )
 log = logging.getLogger("agent")
 
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 120.0
+
 
 class DesktopAgent:
     def __init__(self):
@@ -31,13 +46,36 @@ class DesktopAgent:
         self.client.on_connect = self._on_connect
         self.client.on_disconnect = self._on_disconnect
         self.client.on_message = self._on_message
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
         self.running = False
-        self.loop = asyncio.new_event_loop()
+        # Paho's socket is driven with add_reader/add_writer, which the
+        # Windows Proactor loop does not implement - use a selector loop.
+        self.loop = asyncio.SelectorEventLoop()
+        self._tasks: set[asyncio.Task] = set()
+        self._publish_q: asyncio.Queue[tuple[str, bytes, int]] = asyncio.Queue()
+        self._misc_timer: asyncio.TimerHandle | None = None
+        # Reconnect backoff, same 1 -> 120 s doubling paho's loop_start thread used
+        self._reconnecting = False
+        self._reconnect_delay = RECONNECT_MIN_DELAY
+        self._next_reconnect = 0.0
+        self._status_ops: tuple[str, ...] = ()
+        # Response ids: random per-process prefix + counter (no urandom per message)
+        self._id_prefix = uuid.uuid4().hex[:8]
+        self._id_seq = itertools.count()
+        self._sem = asyncio.Semaphore(config.AGENT_MAX_CONCURRENCY)
+        self._op_sems = {
+            name: asyncio.Semaphore(config.HEAVY_OPERATION_CONCURRENCY)
+            for name in config.HEAVY_OPERATIONS
+        }
 
     def _on_connect(self, client, userdata, flags, reason_code, properties):
         if reason_code == 0:
+            self._reconnect_delay = RECONNECT_MIN_DELAY
             log.info(f"Connected to MQTT broker at {config.MQTT_BROKER_HOST}:{config.MQTT_BROKER_PORT}")
-            client.subscribe(config.TOPICS["REQUEST"], qos=1)
+            client.subscribe(config.TOPIC_REQUEST, qos=1)
             self._publish_status("online")
         else:
             log.error(f"Connection failed with code: {reason_code}")
@@ -46,102 +84,215 @@ class DesktopAgent:
         if reason_code != 0:
             log.warning(f"Unexpected disconnect (code: {reason_code}), reconnecting...")
 
+    def _in_loop(self, fn, *args):
+        # Socket callbacks also fire from the reconnect worker thread
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            fn(*args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._in_loop(self.loop.add_reader, sock, client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._in_loop(self.loop.remove_reader, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._in_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._in_loop(self.loop.remove_writer, sock)
+
+    def _misc_tick(self):
+        # Keepalive pings and reconnects (what loop_start's thread used to do)
+        try:
+            if self._reconnecting:
+                return
+            if self.client.loop_misc() == mqtt.MQTT_ERR_NO_CONN and self.running:
+                if time.monotonic() >= self._next_reconnect:
+                    self._start_reconnect()
+        except Exception as e:
+            log.error(f"MQTT housekeeping failed: {e}")
+        finally:
+            self._misc_timer = self.loop.call_later(1.0, self._misc_tick)
+
+    def _start_reconnect(self):
+        # reconnect() blocks on the TCP connect and websocket handshake, so it
+        # runs in a daemon thread; the loop keeps serving in the meantime.
+        self._reconnecting = True
+        threading.Thread(target=self._reconnect_worker, daemon=True).start()
+
+    def _reconnect_worker(self):
+        try:
+            self.client.reconnect()
+            error = None
+        except Exception as e:
+            error = e
+        try:
+            self.loop.call_soon_threadsafe(self._reconnect_done, error)
+        except RuntimeError:
+            pass  # Loop already closed during shutdown
+
+    def _reconnect_done(self, error: Exception | None):
+        self._reconnecting = False
+        if error is None:
+            return
+        log.warning(f"Reconnect failed: {error} (retrying in {self._reconnect_delay:.0f}s)")
+        self._next_reconnect = time.monotonic() + self._reconnect_delay
+        self._reconnect_delay = min(self._reconnect_delay * 2, RECONNECT_MAX_DELAY)
+
     def _on_message(self, client, userdata, msg):
-        if msg.topic != config.TOPICS["REQUEST"]:
+        if msg.topic != config.TOPIC_REQUEST:
             return
 
+        task = self.loop.create_task(self._handle_request(msg))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle_request(self, msg):
+        request_id = None
+        qos = config.RESPONSE_QOS
         try:
-            data = json.loads(msg.payload.decode())
+            data = _loads(msg.payload)
             request_id = data.get("id")
             payload = data.get("payload", {})
             action = payload.get("action")
             params = payload.get("params", {})
+            if payload.get("qos") in (0, 1, 2):
+                qos = payload["qos"]
 
             if not action:
-                self._publish_error(request_id, "Missing 'action' in payload")
+                self._publish_error(request_id, "Missing 'action' in payload", qos)
                 return
 
             log.info(f"Executing: {action} (id: {request_id[:8]}...)")
 
-            # Run operation (supports both sync and async)
-            result = self.loop.run_until_complete(operations.execute(action, params))
+            # Run operation (supports both sync and async). Heavy operations are
+            # limited only by their own slots, so a long run_command can never
+            # occupy the pool that cheap requests run in.
+            async with self._op_sems.get(action, self._sem):
+                result = await operations.execute(action, params)
 
-            self._publish_response(request_id, result)
+            self._publish_response(request_id, result, qos)
             log.info(f"Completed: {action}")
 
         except json.JSONDecodeError:
             log.error("Received invalid JSON")
         except Exception as e:
             log.error(f"Operation failed: {e}")
-            request_id = data.get("id") if "data" in dir() else None
             if request_id:
-                self._publish_error(request_id, str(e))
+                self._publish_error(request_id, str(e), qos)
 
-    def _publish_response(self, request_id: str, data: dict):
+    def _next_id(self) -> str:
+        return f"{self._id_prefix}-{next(self._id_seq):x}"
+
+    # Responses are correlated by requestId and safe to lose/resend, so they
+    # default to QoS 0 (no PUBACK round-trip); status stays QoS 1.
+    def _publish_response(self, request_id: str, data: dict, qos: int = config.RESPONSE_QOS):
         packet = {
             "type": "response",
-            "id": str(uuid.uuid4()),
-            "timestamp": int(time.time() * 1000),
+            "id": self._next_id(),
+            "timestamp": time.time_ns() // 1_000_000,
             "payload": {
                 "requestId": request_id,
                 "data": data,
             },
         }
-        self.client.publish(config.TOPICS["RESPONSE"], json.dumps(packet), qos=1)
+        self._publish_q.put_nowait((config.TOPIC_RESPONSE, _dumps(packet), qos))
 
-    def _publish_error(self, request_id: str, message: str):
+    def _publish_error(self, request_id: str, message: str, qos: int = config.RESPONSE_QOS):
         packet = {
             "type": "error",
-            "id": str(uuid.uuid4()),
-            "timestamp": int(time.time() * 1000),
+            "id": self._next_id(),
+            "timestamp": time.time_ns() // 1_000_000,
             "payload": {
                 "requestId": request_id,
                 "message": message,
             },
         }
-        self.client.publish(config.TOPICS["RESPONSE"], json.dumps(packet), qos=1)
+        self._publish_q.put_nowait((config.TOPIC_RESPONSE, _dumps(packet), qos))
+
+    def _publish(self, topic: str, payload: bytes, qos: int):
+        try:
+            self.client.publish(topic, payload, qos=qos)
+        except Exception as e:
+            log.error(f"Publish to {topic} failed: {e}")
+
+    def _flush_publishes(self):
+        while not self._publish_q.empty():
+            self._publish(*self._publish_q.get_nowait())
+
+    async def _pump_publishes(self):
+        # Hands paho everything queued since the last wake-up in one go; paho
+        # then sends those packets (one send() each) from a single writable
+        # callback. An optional flush interval widens the batch at the cost
+        # of that much added latency per response.
+        while True:
+            item = await self._publish_q.get()
+            try:
+                if config.PUBLISH_FLUSH_INTERVAL > 0:
+                    await asyncio.sleep(config.PUBLISH_FLUSH_INTERVAL)
+            finally:
+                self._publish(*item)
+                self._flush_publishes()
 
     def _publish_status(self, status: str):
         packet = {
             "type": "status",
-            "id": str(uuid.uuid4()),
-            "timestamp": int(time.time() * 1000),
+            "id": uuid.uuid4().hex,
+            "timestamp": time.time_ns() // 1_000_000,
             "payload": {
                 "status": status,
-                "operations": operations.list_operations(),
+                "operations": self._status_ops,
                 "clientId": config.MQTT_CLIENT_ID,
             },
         }
-        self.client.publish(config.TOPICS["STATUS"], json.dumps(packet), qos=1, retain=True)
-        log.info(f"Published status: {status} ({len(operations.list_operations())} operations available)")
+        self.client.publish(config.TOPIC_STATUS, _dumps(packet), qos=1, retain=True)
+        log.info(f"Published status: {status} ({len(self._status_ops)} operations available)")
 
     def start(self):
         operations.load_all()
+        # The operation set is fixed once all modules are loaded
+        self._status_ops = operations.list_operations()
 
         log.info(f"Connecting to ws://{config.MQTT_BROKER_HOST}:{config.MQTT_BROKER_PORT}...")
         self.client.ws_set_options(path="/")
         self.client.connect(config.MQTT_BROKER_HOST, config.MQTT_BROKER_PORT)
 
         self.running = True
-        self.client.loop_start()
+        self._misc_timer = self.loop.call_later(1.0, self._misc_tick)
+        self._pump_task = self.loop.create_task(self._pump_publishes())
 
         log.info("Desktop Agent is running. Press Ctrl+C to stop.")
 
         try:
-            while self.running:
-                time.sleep(1)
+            self.loop.run_forever()
         except KeyboardInterrupt:
             pass
         finally:
-            self.stop()
+            self._shutdown()
 
     def stop(self):
+        """Ask the event loop to exit; safe to call from a signal handler."""
+        self.running = False
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _shutdown(self):
         log.info("Shutting down...")
         self.running = False
+        if self._misc_timer:
+            self._misc_timer.cancel()
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+        self._flush_publishes()
         self._publish_status("offline")
-        time.sleep(0.5)  # Let the offline status message be sent
-        self.client.loop_stop()
         self.client.disconnect()
+        # Let in-flight tasks unwind and the offline status message be sent
+        self.loop.run_until_complete(asyncio.sleep(0.5))
         self.loop.close()
         log.info("Desktop Agent stopped.")
 
@@ -151,7 +302,6 @@ def main():
 
     def signal_handler(sig, frame):
         agent.stop()
-        sys.exit(0)
 
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
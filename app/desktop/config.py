@@ -7,12 +7,29 @@ MQTT_BROKER_HOST = os.getenv("MQTT_BROKER_HOST", "localhost")
 MQTT_BROKER_PORT = int(os.getenv("MQTT_BROKER_PORT", "1893"))
 MQTT_CLIENT_ID = os.getenv("MQTT_CLIENT_ID", f"mycastle_desktop_{os.getpid()}")
 
+TOPIC_REQUEST = "mycastle/desktop/request"
+TOPIC_RESPONSE = "mycastle/desktop/response"
+TOPIC_STATUS = "mycastle/desktop/status"
+
 TOPICS = {
-    "REQUEST": "mycastle/desktop/request",
-    "RESPONSE": "mycastle/desktop/response",
-    "STATUS": "mycastle/desktop/status",
+    "REQUEST": TOPIC_REQUEST,
+    "RESPONSE": TOPIC_RESPONSE,
+    "STATUS": TOPIC_STATUS,
 }
 
+# Default QoS for response/error packets (requests may override via payload "qos")
+RESPONSE_QOS = int(os.getenv("MQTT_RESPONSE_QOS", "0"))
+
+# Optional delay (seconds) to batch responses before handing them to paho;
+# 0 publishes whatever is already queued without waiting
+PUBLISH_FLUSH_INTERVAL = float(os.getenv("MQTT_PUBLISH_FLUSH_INTERVAL", "0"))
+
 # Shell command execution limits
 SHELL_COMMAND_TIMEOUT = int(os.getenv("SHELL_COMMAND_TIMEOUT", "30"))
 SHELL_MAX_OUTPUT_SIZE = int(os.getenv("SHELL_MAX_OUTPUT_SIZE", "65536"))
+
+# Concurrent request limits - a shared pool for ordinary operations, and
+# separate per-operation limits for ones that spawn processes or thread-pool work
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", str(os.cpu_count() or 4)))
+HEAVY_OPERATION_CONCURRENCY = int(os.getenv("HEAVY_OPERATION_CONCURRENCY", "2"))
+HEAVY_OPERATIONS = ("screenshot", "run_command")
@@ -1,10 +1,13 @@
+import inspect
 import logging
 from typing import Callable, Any
 
 log = logging.getLogger(__name__)
 
-# Global operation registry
-_operations: dict[str, Callable[..., Any]] = {}
+# Global operation registry: name -> (fn, is_coroutine_function)
+_operations: dict[str, tuple[Callable[..., Any], bool]] = {}
+# Sorted operation names, rebuilt lazily after each registration
+_sorted_names: tuple[str, ...] | None = None
 
 
 def operation(name: str):
@@ -16,26 +19,31 @@ def operation(name: str):
             ...
     """
     def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
-        _operations[name] = fn
+        global _sorted_names
+        _operations[name] = (fn, inspect.iscoroutinefunction(fn))
+        _sorted_names = None
         return fn
     return decorator
 
 
 def get_operations() -> dict[str, Callable[..., Any]]:
-    return dict(_operations)
+    return {name: fn for name, (fn, _) in _operations.items()}
 
 
-def list_operations() -> list[str]:
-    return sorted(_operations.keys())
+def list_operations() -> tuple[str, ...]:
+    global _sorted_names
+    if _sorted_names is None:
+        _sorted_names = tuple(sorted(_operations))
+    return _sorted_names
 
 
 async def execute(action: str, params: dict | None = None) -> Any:
-    fn = _operations.get(action)
-    if fn is None:
+    entry = _operations.get(action)
+    if entry is None:
         raise ValueError(f"Unknown operation: {action}")
+    fn, is_coro = entry
     params = params or {}
-    import asyncio
-    if asyncio.iscoroutinefunction(fn):
+    if is_coro:
         return await fn(params)
     return fn(params)
 
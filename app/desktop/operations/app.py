@@ -1,8 +1,19 @@
+import logging
 import os
 import subprocess
 import webbrowser
 from operations import operation
 
+log = logging.getLogger(__name__)
+
+# Resolve the default browser once - webbrowser probes the system (registry,
+# xdg-settings, PATH) to find it
+try:
+    _BROWSER = webbrowser.get()
+except webbrowser.Error:
+    _BROWSER = None
+    log.warning("No web browser found - open_url disabled")
+
 
 @operation("open_app")
 def open_app(params: dict) -> dict:
@@ -26,5 +37,8 @@ def open_url(params: dict) -> dict:
     if not url:
         raise ValueError("url is required")
 
-    webbrowser.open(url)
+    if _BROWSER is None:
+        raise RuntimeError("No web browser available - open_url unavailable")
+
+    _BROWSER.open(url, new=params.get("new", 0))
     return {"success": True}
@@ -1,67 +1,121 @@
+import asyncio
 import base64
 import io
 import logging
+import threading
 from operations import operation
 
 log = logging.getLogger(__name__)
 
 try:
     from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
-    from comtypes import CLSCTX_ALL
+    from comtypes import CLSCTX_ALL, COMError
     HAS_PYCAW = True
 except ImportError:
     HAS_PYCAW = False
     log.warning("pycaw not available - volume operations disabled")
 
 
+# Activated IAudioEndpointVolume, reused across calls (activation is 3 COM round-trips)
+_VOL_IFACE = None
+_VOL_LOCK = threading.Lock()
+
+
 def _get_volume_interface():
+    global _VOL_IFACE
     if not HAS_PYCAW:
         raise RuntimeError("pycaw is not installed - volume operations unavailable")
-    devices = AudioUtilities.GetSpeakers()
-    interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
-    return interface.QueryInterface(IAudioEndpointVolume)
-
-
-@operation("screenshot")
-def screenshot(params: dict) -> dict:
+    if _VOL_IFACE is None:
+        with _VOL_LOCK:
+            if _VOL_IFACE is None:
+                devices = AudioUtilities.GetSpeakers()
+                interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
+                _VOL_IFACE = interface.QueryInterface(IAudioEndpointVolume)
+    return _VOL_IFACE
+
+
+def _with_volume(fn):
+    """Run fn(vol) under the lock, re-activating once if the cached interface went stale."""
+    global _VOL_IFACE
+    vol = _get_volume_interface()
+    try:
+        with _VOL_LOCK:
+            return fn(vol)
+    except COMError:
+        with _VOL_LOCK:
+            _VOL_IFACE = None
+        vol = _get_volume_interface()
+        with _VOL_LOCK:
+            return fn(vol)
+
+
+def _grab_encode(fmt: str, quality: int) -> tuple[str, tuple[int, int]]:
     from PIL import ImageGrab
 
     img = ImageGrab.grab()
+    size = img.size
     buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    b64 = base64.b64encode(buffer.getvalue()).decode("ascii")
+    if fmt == "jpeg":
+        img.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=False)
+    else:
+        # Fastest zlib level - much less CPU for a slightly bigger file
+        img.save(buffer, format="PNG", compress_level=1)
+    del img  # Raw bitmap is the largest object (~33 MB at 4K) - free it first
+
+    # Encode from the buffer itself (getvalue() would copy it) and drop the
+    # encoded image before the final str is built.
+    with buffer.getbuffer() as view:
+        b64 = base64.b64encode(view)
+    buffer.close()
+    return b64.decode("ascii"), size
+
+
+@operation("screenshot")
+async def screenshot(params: dict) -> dict:
+    fmt = params.get("format", "png")
+    if fmt not in ("png", "jpeg"):
+        raise ValueError("format must be 'png' or 'jpeg'")
+    quality = int(params.get("quality", 80))
+
+    # Grab and encode take hundreds of ms on large displays - keep them off the event loop
+    b64, (width, height) = await asyncio.to_thread(_grab_encode, fmt, quality)
 
     return {
         "image": b64,
-        "width": img.width,
-        "height": img.height,
-        "format": "png",
+        "width": width,
+        "height": height,
+        "format": fmt,
     }
 
 
 @operation("get_volume")
 def get_volume(params: dict) -> dict:
-    vol = _get_volume_interface()
-    level = round(vol.GetMasterVolumeLevelScalar() * 100)
-    muted = bool(vol.GetMute())
-    return {"level": level, "muted": muted}
+    def read(vol):
+        level = round(vol.GetMasterVolumeLevelScalar() * 100)
+        muted = bool(vol.GetMute())
+        return {"level": level, "muted": muted}
+
+    return _with_volume(read)
 
 
 @operation("set_volume")
 def set_volume(params: dict) -> dict:
-    vol = _get_volume_interface()
-
     level = params.get("level")
     muted = params.get("muted")
 
     if level is not None:
         level = max(0, min(100, int(level)))
-        vol.SetMasterVolumeLevelScalar(level / 100, None)
 
-    if muted is not None:
-        vol.SetMute(bool(muted), None)
+    def write(vol):
+        if level is not None:
+            vol.SetMasterVolumeLevelScalar(level / 100, None)
 
-    return {
-        "level": round(vol.GetMasterVolumeLevelScalar() * 100),
-        "muted": bool(vol.GetMute()),
-    }
+        if muted is not None:
+            vol.SetMute(bool(muted), None)
+
+        return {
+            "level": round(vol.GetMasterVolumeLevelScalar() * 100),
+            "muted": bool(vol.GetMute()),
+        }
+
+    return _with_volume(write)
@@ -1,31 +1,56 @@
+import asyncio
+import heapq
 import psutil
 from operations import operation
 
+CPU_SAMPLE_INTERVAL = 0.2  # seconds between the two cpu_percent passes
+
 
 @operation("list_processes")
-def list_processes(params: dict) -> dict:
+async def list_processes(params: dict) -> dict:
     sort_by = params.get("sort_by", "memory")  # "memory", "cpu", "name"
     limit = params.get("limit", 50)
 
-    processes = []
-    for proc in psutil.process_iter(["pid", "name", "cpu_percent", "memory_info"]):
+    # cpu_percent() is always 0.0 on a process's first call - prime every
+    # process, wait one sampling interval, then read the real values.
+    procs = list(psutil.process_iter())
+    for proc in procs:
         try:
-            info = proc.info
-            mem_mb = round(info["memory_info"].rss / (1024 * 1024), 1) if info["memory_info"] else 0
-            processes.append({
-                "pid": info["pid"],
-                "name": info["name"],
-                "cpu_percent": info["cpu_percent"] or 0,
-                "memory_mb": mem_mb,
-            })
+            proc.cpu_percent(None)
         except (psutil.NoSuchProcess, psutil.AccessDenied):
             continue
+    await asyncio.sleep(CPU_SAMPLE_INTERVAL)
+
+    processes = []
+    for proc in procs:
+        try:
+            # oneshot() batches the underlying /proc reads / NtQuery calls
+            with proc.oneshot():
+                try:
+                    name = proc.name()
+                except psutil.AccessDenied:
+                    name = None
+                try:
+                    cpu_percent = proc.cpu_percent(None)
+                    mem_mb = round(proc.memory_info().rss / (1024 * 1024), 1)
+                except psutil.AccessDenied:
+                    cpu_percent, mem_mb = 0, 0
+        except psutil.NoSuchProcess:
+            continue
+        processes.append({
+            "pid": proc.pid,
+            "name": name,
+            "cpu_percent": cpu_percent,
+            "memory_mb": mem_mb,
+        })
 
-    key = {"memory": "memory_mb", "cpu": "cpu_percent", "name": "name"}.get(sort_by, "memory_mb")
-    reverse = sort_by != "name"
-    processes.sort(key=lambda p: p[key], reverse=reverse)
+    if sort_by == "name":
+        top = heapq.nsmallest(limit, processes, key=lambda p: p["name"] or "")
+    else:
+        key = "cpu_percent" if sort_by == "cpu" else "memory_mb"
+        top = heapq.nlargest(limit, processes, key=lambda p: p[key])
 
-    return {"processes": processes[:limit], "total": len(processes)}
+    return {"processes": top, "total": len(processes)}
 
 
 @operation("kill_process")
@@ -1,30 +1,123 @@
+import asyncio
+import errno
+import re
+import shlex
 import subprocess
+import threading
 from config import SHELL_COMMAND_TIMEOUT, SHELL_MAX_OUTPUT_SIZE
 from operations import operation
 
 
+# Anything the shell would interpret (pipes, redirection, expansion, quoting,
+# cmd.exe %VAR% / ^ escapes). Commands without these can be exec'd directly,
+# saving the extra shell process.
+_SHELL_META = re.compile(r"[|&;<>()$`\\\"'*?\[\]{}~#%^\n]")
+
+
+def _result(stdout: bytes, stderr: bytes, return_code: int | None) -> dict:
+    return {
+        "stdout": stdout.decode(errors="replace")[:SHELL_MAX_OUTPUT_SIZE],
+        "stderr": stderr.decode(errors="replace")[:SHELL_MAX_OUTPUT_SIZE],
+        "return_code": return_code,
+    }
+
+
+def _resolve(fut: asyncio.Future, result):
+    if not fut.done():
+        fut.set_result(result)
+
+
+async def _run_threaded(command: str, argv: list[str] | None, timeout: float) -> dict:
+    if argv is None:
+        proc = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    else:
+        proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def communicate():
+        try:
+            result = proc.communicate(timeout=timeout)
+        except Exception as e:
+            result = e
+        try:
+            loop.call_soon_threadsafe(_resolve, done, result)
+        except RuntimeError:
+            pass  # Loop already closed during shutdown
+
+    # Daemon thread, so interpreter exit never waits for a running command
+    threading.Thread(target=communicate, daemon=True).start()
+    try:
+        result = await done
+    except asyncio.CancelledError:
+        proc.kill()
+        raise
+
+    if isinstance(result, subprocess.TimeoutExpired):
+        proc.kill()
+        raise TimeoutError(f"Command timed out after {timeout} seconds")
+    if isinstance(result, Exception):
+        raise result
+    stdout, stderr = result
+    return _result(stdout, stderr, proc.returncode)
+
+
+async def _run(command: str, argv: list[str] | None, timeout: float) -> dict:
+    """Run argv directly, or command through the shell when argv is None."""
+    try:
+        if argv is None:
+            proc = await asyncio.create_subprocess_shell(
+                command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        else:
+            proc = await asyncio.create_subprocess_exec(
+                *argv,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+    except NotImplementedError:
+        # Selector event loops on Windows cannot spawn subprocesses
+        return await _run_threaded(command, argv, timeout)
+
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise TimeoutError(f"Command timed out after {timeout} seconds")
+    except asyncio.CancelledError:
+        proc.kill()  # Don't leave the command running past agent shutdown
+        raise
+
+    return _result(stdout, stderr, proc.returncode)
+
+
 @operation("run_command")
-def run_command(params: dict) -> dict:
+async def run_command(params: dict) -> dict:
     command = params.get("command")
-    if not command:
+    if not command or not command.strip():
         raise ValueError("command is required")
 
     timeout = params.get("timeout", SHELL_COMMAND_TIMEOUT)
     timeout = min(timeout, 120)  # Hard cap at 2 minutes
 
-    result = subprocess.run(
-        command,
-        shell=True,
-        capture_output=True,
-        text=True,
-        timeout=timeout,
-    )
-
-    stdout = result.stdout[:SHELL_MAX_OUTPUT_SIZE]
-    stderr = result.stderr[:SHELL_MAX_OUTPUT_SIZE]
+    use_shell = params.get("shell")
+    if use_shell or (use_shell is None and _SHELL_META.search(command)):
+        return await _run(command, None, timeout)
 
-    return {
-        "stdout": stdout,
-        "stderr": stderr,
-        "return_code": result.returncode,
-    }
+    argv = shlex.split(command)
+    if not argv:
+        raise ValueError("command is required")
+    if use_shell is not None:
+        return await _run(command, argv, timeout)
+    try:
+        return await _run(command, argv, timeout)
+    except OSError as e:
+        # Not a runnable executable (shell builtin such as dir, a directory, a
+        # non-executable or shebang-less file) - let the shell run it and
+        # report the exit code
+        if not isinstance(e, (FileNotFoundError, PermissionError)) and e.errno != errno.ENOEXEC:
+            raise
+        return await _run(command, None, timeout)
@@ -1,11 +1,30 @@
+import asyncio
 import platform
 import socket
 import psutil
 from operations import operation
 
+# cpu_percent(interval=None) reports usage since the previous call; the first
+# call here primes that baseline. Once system_info is used, a background task
+# keeps the reading fresh so requests never sleep waiting for a sample.
+_cpu_percent = psutil.cpu_percent(interval=None)
+_cpu_sampler: asyncio.Task | None = None
+
+
+async def _sample_cpu():
+    global _cpu_percent
+    while True:
+        await asyncio.sleep(2)
+        _cpu_percent = psutil.cpu_percent(interval=None)
+
 
 @operation("system_info")
-def system_info(params: dict) -> dict:
+async def system_info(params: dict) -> dict:
+    global _cpu_percent, _cpu_sampler
+    if _cpu_sampler is None:
+        _cpu_percent = psutil.cpu_percent(interval=None)
+        _cpu_sampler = asyncio.create_task(_sample_cpu())
+
     mem = psutil.virtual_memory()
     disk = psutil.disk_usage("/")
     return {
@@ -14,7 +33,7 @@ def system_info(params: dict) -> dict:
         "os_version": platform.version(),
         "architecture": platform.machine(),
         "cpu_count": psutil.cpu_count(),
-        "cpu_percent": psutil.cpu_percent(interval=0.5),
+        "cpu_percent": _cpu_percent,
         "ram_total_mb": round(mem.total / (1024 * 1024)),
         "ram_used_mb": round(mem.used / (1024 * 1024)),
         "ram_percent": mem.percent,
@@ -1,4 +1,6 @@
+import ctypes
 import logging
+import time
 from operations import operation
 
 log = logging.getLogger(__name__)
@@ -10,32 +12,129 @@ except ImportError:
     HAS_PYGETWINDOW = False
     log.warning("pygetwindow not available - window operations disabled")
 
+# Direct user32 access for list_windows: one EnumWindows pass with 4 calls per
+# window instead of a pygetwindow property (= Win32 call) per field. A private
+# WinDLL instance, because argtypes set on the shared ctypes.windll.user32
+# would also apply to pygetwindow's calls (its own callback/RECT types).
+try:
+    from ctypes import wintypes
+    _user32 = ctypes.WinDLL("user32", use_last_error=True)
+    _EnumWindowsProc = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+    _user32.EnumWindows.argtypes = [_EnumWindowsProc, wintypes.LPARAM]
+    _user32.IsWindowVisible.argtypes = [wintypes.HWND]
+    _user32.GetWindowTextLengthW.argtypes = [wintypes.HWND]
+    _user32.GetWindowTextW.argtypes = [wintypes.HWND, wintypes.LPWSTR, ctypes.c_int]
+    _user32.GetWindowRect.argtypes = [wintypes.HWND, ctypes.POINTER(wintypes.RECT)]
+    HAS_USER32 = True
+except (ImportError, AttributeError):
+    HAS_USER32 = False
+
 
 def _require_pygetwindow():
     if not HAS_PYGETWINDOW:
         raise RuntimeError("pygetwindow is not installed - window operations unavailable")
 
 
+# Window enumeration reused for a short time: [timestamp, {hwnd: window}, title index]
+# The title index [(title_lower, hwnd)] costs a Win32 call per window, so it
+# is only built when a title lookup needs it. Windows seen by the user32 pass
+# in list_windows are stored as None and wrapped in a pygetwindow object on use.
+_WIN_CACHE_TTL = 0.25
+_WIN_CACHE: list | None = None
+
+
+def _get_cache(refresh: bool = False) -> list:
+    global _WIN_CACHE
+    now = time.monotonic()
+    if refresh or _WIN_CACHE is None or now - _WIN_CACHE[0] >= _WIN_CACHE_TTL:
+        _WIN_CACHE = [now, {w._hWnd: w for w in gw.getAllWindows()}, None]
+    return _WIN_CACHE
+
+
+def _cached_window(cache: list, hwnd: int):
+    w = cache[1][hwnd]
+    if w is None:
+        w = cache[1][hwnd] = gw.Win32Window(hwnd)
+    return w
+
+
+def _get_titles(cache: list) -> list:
+    if cache[2] is None:
+        cache[2] = [(_cached_window(cache, hwnd).title.lower(), hwnd) for hwnd in cache[1]]
+    return cache[2]
+
+
+def _invalidate_cache():
+    global _WIN_CACHE
+    _WIN_CACHE = None
+
+
 def _find_window(title: str | None = None, hwnd: int | None = None):
     _require_pygetwindow()
+    cache = _get_cache()
     if hwnd:
-        for w in gw.getAllWindows():
-            if w._hWnd == hwnd:
-                return w
-        raise ValueError(f"Window with hwnd={hwnd} not found")
+        if hwnd not in cache[1]:
+            raise ValueError(f"Window with hwnd={hwnd} not found")
+        return _cached_window(cache, hwnd)
     if title:
-        matches = [w for w in gw.getAllWindows() if title.lower() in w.title.lower()]
-        if not matches:
-            raise ValueError(f"No window matching title '{title}'")
-        return matches[0]
+        needle = title.lower()
+        for title_lower, w_hwnd in _get_titles(cache):
+            if needle in title_lower:
+                return _cached_window(cache, w_hwnd)
+        raise ValueError(f"No window matching title '{title}'")
     raise ValueError("title or hwnd is required")
 
 
+def _enum_windows() -> list[dict]:
+    global _WIN_CACHE
+    windows = []
+    by_hwnd = {}
+    titles_lower = []
+    title_buf = ctypes.create_unicode_buffer(512)
+    rect = wintypes.RECT()
+
+    def callback(hwnd, _):
+        nonlocal title_buf
+        # Same filter as pygetwindow.getAllWindows(): visible windows only
+        if not _user32.IsWindowVisible(hwnd):
+            return True
+        by_hwnd[hwnd] = None
+        length = _user32.GetWindowTextLengthW(hwnd)
+        if not length:
+            return True
+        if length >= len(title_buf):
+            title_buf = ctypes.create_unicode_buffer(length + 1)
+        if not _user32.GetWindowTextW(hwnd, title_buf, len(title_buf)):
+            return True
+        title = title_buf.value
+        titles_lower.append((title.lower(), hwnd))
+        _user32.GetWindowRect(hwnd, ctypes.byref(rect))
+        windows.append({
+            "title": title,
+            "hwnd": hwnd,
+            "x": rect.left,
+            "y": rect.top,
+            "width": rect.right - rect.left,
+            "height": rect.bottom - rect.top,
+            "visible": True,
+        })
+        return True
+
+    _user32.EnumWindows(_EnumWindowsProc(callback), 0)
+    if HAS_PYGETWINDOW:
+        # Let a focus_window right after list_windows reuse this enumeration
+        _WIN_CACHE = [time.monotonic(), by_hwnd, titles_lower]
+    return windows
+
+
 @operation("list_windows")
 def list_windows(params: dict) -> dict:
+    if HAS_USER32:
+        return {"windows": _enum_windows()}
+
     _require_pygetwindow()
     windows = []
-    for w in gw.getAllWindows():
+    for w in _get_cache(refresh=True)[1].values():
         if not w.title:
             continue
         windows.append({
@@ -76,4 +175,5 @@ def close_window(params: dict) -> dict:
     w = _find_window(params.get("title"), params.get("hwnd"))
     title = w.title
     w.close()
+    _invalidate_cache()
     return {"success": True, "title": title}